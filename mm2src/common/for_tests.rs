@@ -3,9 +3,9 @@
 use bigdecimal::BigDecimal;
 use chrono::{Local, TimeZone};
 use http::{HeaderMap, StatusCode};
-use rand::Rng;
+use rand::seq::IteratorRandom;
 use serde_json::{self as json, Value as Json};
-use std::collections::HashMap;
+use std::collections::{HashMap, HashSet};
 use std::net::{IpAddr, Ipv4Addr};
 use std::path::{Path, PathBuf};
 use std::process::Child;
@@ -24,12 +24,15 @@ cfg_wasm32! {
 cfg_native! {
     use crate::block_on;
     use crate::log::{dashboard_path, LogState};
-    use crate::wio::{slurp_req, POOL};
+    use crate::wio::{drive03, CORE, POOL};
+    use crate::SlurpRes;
     use bytes::Bytes;
     use futures::channel::oneshot;
     use futures::task::SpawnExt;
     use gstuff::ISATTY;
     use http::Request;
+    use hyper::client::HttpConnector;
+    use hyper::{Body, Client};
     use regex::Regex;
     use std::env;
     use std::fs;
@@ -98,6 +101,12 @@ pub const TAKER_ERROR_EVENTS: [&str; 13] = [
     "TakerPaymentRefundFailed",
 ];
 
+lazy_static! {
+    /// The maker and taker error events, used to detect a failed swap in a single pass over its events.
+    static ref SWAP_ERROR_EVENTS: HashSet<&'static str> =
+        MAKER_ERROR_EVENTS.iter().chain(TAKER_ERROR_EVENTS.iter()).copied().collect();
+}
+
 /// Automatically kill a wrapped process.
 pub struct RaiiKill {
     pub handle: Child,
@@ -170,6 +179,37 @@ lazy_static! {
     static ref MM_IPS: Mutex<HashMap<IpAddr, bool>> = Mutex::new (HashMap::new());
 }
 
+#[cfg(not(target_arch = "wasm32"))]
+lazy_static! {
+    /// The HTTP client used to send the RPC requests to the MarketMakerIt instances.
+    /// Unlike the shared `HYPER` client it keeps the idle Keep-Alive connections in the pool,
+    /// so that the many small RPCs issued by a test don't pay for a new TCP connection each.
+    /// `HYPER` disables the pool as we suspect the errno 10054 to come from reusing the connections
+    /// closed on the other side. The MM RPC server doesn't time out the idle connections though,
+    /// it only closes them on the graceful shutdown triggered by the "stop" RPC,
+    /// and the "forcibly closed" error of a late "stop" is already tolerated by `MarketMakerIt::stop`.
+    /// The automatically picked IPs aren't reused, so a pooled connection can't reach another instance.
+    static ref MM_RPC_CLIENT: Client<HttpConnector> = Client::builder()
+        .executor(&*CORE)
+        .pool_idle_timeout(Duration::from_secs(30))
+        .build(HttpConnector::new());
+}
+
+/// Executes the RPC request with the keep-alive `MM_RPC_CLIENT`, returning the response status, headers and body.
+#[cfg(not(target_arch = "wasm32"))]
+async fn slurp_mm_rpc(request: Request<Vec<u8>>) -> SlurpRes {
+    let (head, body) = request.into_parts();
+    let request = Request::from_parts(head, Body::from(body));
+
+    let request_f = MM_RPC_CLIENT.request(request);
+    let response = try_s!(try_s!(drive03(request_f).await));
+    let status = response.status();
+    let headers = response.headers().clone();
+    let body = response.into_body();
+    let output = try_s!(hyper::body::to_bytes(body).await);
+    Ok((status, headers, output.to_vec()))
+}
+
 #[cfg(not(target_arch = "wasm32"))]
 pub type LocalStart = fn(PathBuf, PathBuf, Json);
 
@@ -242,25 +282,18 @@ impl MarketMakerIt {
         envs: &[(&str, &str)],
     ) -> Result<MarketMakerIt, String> {
         let ip: IpAddr = if conf["myipaddr"].is_null() {
-            // Generate an unique IP.
-            let mut attempts = 0;
+            // Pick an unique IP at random among the ones that aren't used yet.
             let mut rng = super::small_rng();
-            loop {
-                let ip4 = Ipv4Addr::new(127, 0, 0, rng.gen_range(1, 255));
-                if attempts > 128 {
-                    return ERR!("Out of local IPs?");
-                }
-                let ip: IpAddr = ip4.clone().into();
-                let mut mm_ips = try_s!(MM_IPS.lock());
-                if mm_ips.contains_key(&ip) {
-                    attempts += 1;
-                    continue;
-                }
-                mm_ips.insert(ip, true);
-                conf["myipaddr"] = format!("{}", ip).into();
-                conf["rpcip"] = format!("{}", ip).into();
-                break ip;
-            }
+            let mut mm_ips = try_s!(MM_IPS.lock());
+            let free_ip = (1..255)
+                .map(|last_octet| IpAddr::from(Ipv4Addr::new(127, 0, 0, last_octet)))
+                .filter(|ip| !mm_ips.contains_key(ip))
+                .choose(&mut rng);
+            let ip = try_s!(free_ip.ok_or("Out of local IPs?"));
+            mm_ips.insert(ip, true);
+            conf["myipaddr"] = format!("{}", ip).into();
+            conf["rpcip"] = format!("{}", ip).into();
+            ip
         } else {
             // Just use the IP given in the `conf`.
             let ip: IpAddr = try_s!(try_s!(conf["myipaddr"].as_str().ok_or("myipaddr is not a string")).parse());
@@ -463,12 +496,13 @@ impl MarketMakerIt {
     #[cfg(not(target_arch = "wasm32"))]
     pub async fn rpc(&self, payload: Json) -> Result<(StatusCode, String, HeaderMap), String> {
         let uri = format!("http://{}:7783", self.ip);
-        log!("sending rpc request " (json::to_string(&payload).unwrap()) " to " (uri));
-
+        // Serialize the payload once and log the very bytes that are sent.
         let payload = try_s!(json::to_vec(&payload));
+        log!("sending rpc request " (String::from_utf8_lossy(&payload)) " to " (uri));
+
         let request = try_s!(Request::builder().method("POST").uri(uri).body(payload));
 
-        let (status, headers, body) = try_s!(slurp_req(request).await);
+        let (status, headers, body) = try_s!(slurp_mm_rpc(request).await);
         Ok((status, try_s!(std::str::from_utf8(&body)).trim().into(), headers))
     }
 
@@ -477,7 +511,7 @@ impl MarketMakerIt {
     pub fn rpc_str(&self, payload: &'static str) -> Result<(StatusCode, String, HeaderMap), String> {
         let uri = format!("http://{}:7783", self.ip);
         let request = try_s!(Request::builder().method("POST").uri(uri).body(payload.into()));
-        let (status, headers, body) = try_s!(block_on(slurp_req(request)));
+        let (status, headers, body) = try_s!(block_on(slurp_mm_rpc(request)));
         Ok((status, try_s!(std::str::from_utf8(&body)).trim().into(), headers))
     }
 
@@ -752,9 +786,25 @@ pub fn from_env_file(env: Vec<u8>) -> (Option<String>, Option<String>) {
     (passphrase, userpass)
 }
 
+lazy_static! {
+    /// The parsed .env files by path, so that every file is read and parsed once per test process.
+    static ref ENV_FILES: Mutex<HashMap<PathBuf, (Option<String>, Option<String>)>> = Mutex::new(HashMap::new());
+}
+
+/// Reads passphrase and userpass from .env file, caching the result for the subsequent calls
+fn cached_env_file(path: &Path) -> Result<(Option<String>, Option<String>), String> {
+    let mut env_files = try_s!(ENV_FILES.lock());
+    if let Some(parsed) = env_files.get(path) {
+        return Ok(parsed.clone());
+    }
+    let parsed = from_env_file(try_s!(slurp(&path)));
+    env_files.insert(path.to_path_buf(), parsed.clone());
+    Ok(parsed)
+}
+
 /// Reads passphrase from file or environment.
 pub fn get_passphrase(path: &dyn AsRef<Path>, env: &str) -> Result<String, String> {
-    if let (Some(file_passphrase), _file_userpass) = from_env_file(try_s!(slurp(path))) {
+    if let (Some(file_passphrase), _file_userpass) = try_s!(cached_env_file(path.as_ref())) {
         return Ok(file_passphrase);
     }
 
@@ -849,6 +899,169 @@ pub async fn check_my_swap_status(
         .unwrap();
     assert!(response.0.is_success(), "!status of {}: {}", uuid, response.1);
     let status_response: Json = json::from_str(&response.1).unwrap();
+    check_swap_status_response(
+        uuid,
+        &status_response,
+        expected_success_events,
+        expected_error_events,
+        maker_amount,
+        taker_amount,
+    );
+}
+
+/// The maximum number of `my_swap_status` requests sent within a single batch RPC.
+/// Bounds the time MM spends on one batch and the size of its reply.
+pub const MY_SWAP_STATUS_BATCH_SIZE: usize = 20;
+
+/// Helper function requesting the statuses of the given swaps with batch RPCs
+/// of at most `MY_SWAP_STATUS_BATCH_SIZE` requests each.
+/// Returns the `my_swap_status` replies in the same order as the `uuids`.
+pub async fn my_swaps_status<U: AsRef<str>>(mm: &MarketMakerIt, uuids: &[U]) -> Result<Vec<Json>, String> {
+    let mut statuses = Vec::with_capacity(uuids.len());
+    for chunk in uuids.chunks(MY_SWAP_STATUS_BATCH_SIZE) {
+        let requests: Vec<_> = chunk
+            .iter()
+            .map(|uuid| {
+                json!({
+                    "userpass": mm.userpass,
+                    "method": "my_swap_status",
+                    "params": {
+                        "uuid": uuid.as_ref(),
+                    }
+                })
+            })
+            .collect();
+        let (status_code, body, _headers) = try_s!(mm.rpc(Json::Array(requests)).await);
+        if !status_code.is_success() {
+            return ERR!("!batch my_swap_status: {}", body);
+        }
+        let chunk_statuses: Vec<Json> = try_s!(json::from_str(&body));
+        if chunk_statuses.len() != chunk.len() {
+            return ERR!("!batch my_swap_status: {}", body);
+        }
+        statuses.extend(chunk_statuses);
+    }
+    Ok(statuses)
+}
+
+/// The state of a swap according to the events of its `my_swap_status` reply.
+#[derive(Debug, PartialEq)]
+pub enum SwapState {
+    Ongoing,
+    Finished,
+    /// The swap has reported an error event, described as "{event type}: {error}".
+    Failed(String),
+}
+
+/// Classifies the swap by the given events in a single pass.
+/// The first maker or taker error event marks the swap as failed,
+/// otherwise the swap is finished if the last event is `Finished`.
+pub fn classify_swap_events(events: &[Json]) -> SwapState {
+    for event in events {
+        let event_type = event["event"]["type"].as_str().unwrap_or_default();
+        if SWAP_ERROR_EVENTS.contains(event_type) {
+            let error = event["event"]["data"]["error"].as_str().unwrap_or_default();
+            return SwapState::Failed(format!("{}: {}", event_type, error));
+        }
+    }
+    match events.last() {
+        Some(event) if event["event"]["type"] == "Finished" => SwapState::Finished,
+        _ => SwapState::Ongoing,
+    }
+}
+
+/// Polls the statuses of the given swaps until all of them are finished or `timeout_sec` expires.
+/// Fails as soon as a swap reports one of the maker or taker error events.
+/// The finished swaps are memoized and aren't requested again on the next sweeps.
+/// The polling interval is reset to the minimum whenever a swap makes progress
+/// and grows exponentially while the swaps are idle, capped at 1 second
+/// so that a finished swap is noticed soon enough on the native platforms.
+/// The timeout error lists the pending swaps along with the `error` of their last reply.
+/// Returns the final `my_swap_status` replies in the same order as the `uuids`.
+pub async fn wait_for_swaps_finish<U: AsRef<str>>(
+    mm: &MarketMakerIt,
+    uuids: &[U],
+    timeout_sec: f64,
+) -> Result<Vec<Json>, String> {
+    const MIN_POLL_INTERVAL: f64 = 0.5;
+    const MAX_POLL_INTERVAL: f64 = 1.;
+
+    let start = now_float();
+    let mut poll_interval = MIN_POLL_INTERVAL;
+    // The unfinished swaps with the number of their events examined so far and their last status reply.
+    // Updated incrementally, so a sweep only deals with the swaps that are still running.
+    let mut pending: Vec<(&str, usize, Json)> = uuids.iter().map(|uuid| (uuid.as_ref(), 0, Json::Null)).collect();
+    let mut finished: HashMap<&str, Json> = HashMap::with_capacity(uuids.len());
+    loop {
+        let pending_uuids: Vec<&str> = pending.iter().map(|(uuid, _, _)| *uuid).collect();
+        let statuses = try_s!(my_swaps_status(mm, &pending_uuids).await);
+        let mut still_pending = Vec::with_capacity(pending.len());
+        let mut progressed = false;
+        for ((uuid, mut known_events_num, _), status) in pending.into_iter().zip(statuses) {
+            let events = status["result"]["events"]
+                .as_array()
+                .map(Vec::as_slice)
+                .unwrap_or_default();
+            if events.len() > known_events_num {
+                // Only the events that appeared since the previous sweep have to be examined.
+                let swap_state = classify_swap_events(&events[known_events_num..]);
+                known_events_num = events.len();
+                progressed = true;
+                match swap_state {
+                    SwapState::Failed(reason) => return ERR!("Swap {} failed with {}", uuid, reason),
+                    SwapState::Finished => {
+                        finished.insert(uuid, status);
+                        continue;
+                    },
+                    SwapState::Ongoing => (),
+                }
+            }
+            still_pending.push((uuid, known_events_num, status));
+        }
+        pending = still_pending;
+        if pending.is_empty() {
+            return Ok(uuids
+                .iter()
+                .map(|uuid| finished.remove(uuid.as_ref()).expect("!finished"))
+                .collect());
+        }
+        if now_float() - start > timeout_sec {
+            let pending: Vec<_> = pending
+                .iter()
+                .map(|(uuid, events_num, status)| {
+                    format!("{} ({} events, error: {})", uuid, events_num, status["error"])
+                })
+                .collect();
+            return ERR!(
+                "Timeout expired waiting for the swaps to finish, pending: {:?}",
+                pending
+            );
+        }
+
+        poll_interval = if progressed {
+            MIN_POLL_INTERVAL
+        } else {
+            (poll_interval * 2.).min(MAX_POLL_INTERVAL)
+        };
+        Timer::sleep(poll_interval).await
+    }
+}
+
+/// Helper function checking the events of the `my_swap_status` reply
+pub fn check_swap_status_response(
+    uuid: &str,
+    status_response: &Json,
+    expected_success_events: &[&str],
+    expected_error_events: &[&str],
+    maker_amount: BigDecimal,
+    taker_amount: BigDecimal,
+) {
+    assert!(
+        status_response["error"].is_null(),
+        "!status of {}: {}",
+        uuid,
+        status_response
+    );
     let success_events: Vec<String> = json::from_value(status_response["result"]["success_events"].clone()).unwrap();
     assert_eq!(expected_success_events, success_events.as_slice());
     let error_events: Vec<String> = json::from_value(status_response["result"]["error_events"].clone()).unwrap();
@@ -908,3 +1121,51 @@ pub async fn check_recent_swaps(mm: &MarketMakerIt, expected_len: usize) {
     let swaps: &Vec<Json> = swaps_response["result"]["swaps"].as_array().unwrap();
     assert_eq!(expected_len, swaps.len());
 }
+
+#[cfg(test)]
+mod tests {
+    use super::*;
+
+    #[test]
+    fn test_classify_swap_events() {
+        let events: Vec<Json> = TAKER_SUCCESS_EVENTS
+            .iter()
+            .map(|event_type| json!({"event": {"type": event_type}}))
+            .collect();
+        assert_eq!(SwapState::Finished, classify_swap_events(&events));
+        assert_eq!(SwapState::Ongoing, classify_swap_events(&events[..3]));
+        assert_eq!(SwapState::Ongoing, classify_swap_events(&[]));
+
+        let events = vec![
+            json!({"event": {"type": "Started"}}),
+            json!({"event": {"type": "NegotiateFailed", "data": {"error": "Timeout"}}}),
+            json!({"event": {"type": "Finished"}}),
+        ];
+        let expected = SwapState::Failed("NegotiateFailed: Timeout".into());
+        assert_eq!(expected, classify_swap_events(&events));
+    }
+
+    /// `wait_for_swaps_finish` classifies only the events that appeared since the previous sweep.
+    #[test]
+    fn test_classify_swap_events_after_offset() {
+        let known_events_num = 2;
+        let started = json!({"event": {"type": "Started"}});
+        let negotiated = json!({"event": {"type": "Negotiated"}});
+        let failed = json!({"event": {"type": "TakerPaymentValidateFailed", "data": {"error": "Invalid"}}});
+        let finished = json!({"event": {"type": "Finished"}});
+        let expected = SwapState::Failed("TakerPaymentValidateFailed: Invalid".into());
+
+        // The error event recorded in the same sweep as `Finished` is reported whatever the order.
+        let events = vec![started.clone(), negotiated.clone(), failed.clone(), finished.clone()];
+        assert_eq!(expected, classify_swap_events(&events[known_events_num..]));
+        let events = vec![started.clone(), negotiated.clone(), finished.clone(), failed.clone()];
+        assert_eq!(expected, classify_swap_events(&events[known_events_num..]));
+
+        let events = vec![started.clone(), negotiated.clone(), finished];
+        assert_eq!(SwapState::Finished, classify_swap_events(&events[known_events_num..]));
+
+        // No new events since the previous sweep.
+        let events = vec![started, negotiated];
+        assert_eq!(SwapState::Ongoing, classify_swap_events(&events[known_events_num..]));
+    }
+}
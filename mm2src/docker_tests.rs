@@ -292,18 +292,21 @@ mod docker_tests {
         let mut conf_path = coin_daemon_data_dir(ticker, true);
         std::fs::create_dir_all(&conf_path).unwrap();
         conf_path.push(format!("{}.conf", ticker));
-        Command::new("docker")
+        let status = Command::new("docker")
             .arg("cp")
             .arg(format!("{}:/data/node_0/{}.conf", container.id(), ticker))
             .arg(&conf_path)
             .status()
             .expect("Failed to execute docker command");
+        assert!(
+            status.success(),
+            "Failed to copy the {} config from the container",
+            ticker
+        );
         let timeout = now_ms() + 3000;
-        loop {
-            if conf_path.exists() {
-                break;
-            };
+        while !conf_path.exists() {
             assert!(now_ms() < timeout, "Test timed out");
+            thread::sleep(Duration::from_millis(100));
         }
         UtxoDockerNode {
             container,
@@ -95,18 +95,21 @@ pub fn qtum_docker_node(docker: &Cli, port: u16) -> UtxoDockerNode {
     let mut conf_path = temp_dir().join("qtum-regtest");
     std::fs::create_dir_all(&conf_path).unwrap();
     conf_path.push(format!("{}.conf", name));
-    Command::new("docker")
+    let status = Command::new("docker")
         .arg("cp")
         .arg(format!("{}:/data/node_0/{}.conf", container.id(), name))
         .arg(&conf_path)
         .status()
         .expect("Failed to execute docker command");
+    assert!(
+        status.success(),
+        "Failed to copy the {} config from the container",
+        name
+    );
     let timeout = now_ms() + 3000;
-    loop {
-        if conf_path.exists() {
-            break;
-        };
+    while !conf_path.exists() {
         assert!(now_ms() < timeout, "Test timed out");
+        thread::sleep(Duration::from_millis(100));
     }
 
     unsafe { QTUM_CONF_PATH = Some(conf_path) };
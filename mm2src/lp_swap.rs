@@ -356,10 +356,7 @@ pub fn get_locked_amount(ctx: &MmArc, coin: &str) -> MmNumber {
 pub fn running_swaps_num(ctx: &MmArc) -> u64 {
     let swap_ctx = SwapsContext::from_ctx(&ctx).unwrap();
     let swaps = swap_ctx.running_swaps.lock().unwrap();
-    swaps.iter().fold(0, |total, swap| match swap.upgrade() {
-        Some(_) => total + 1,
-        None => total,
-    })
+    swaps.iter().filter(|swap| swap.strong_count() > 0).count() as u64
 }
 
 /// Get total amount of selected coin locked by all currently ongoing swaps except the one with selected uuid
@@ -403,12 +400,11 @@ pub fn active_swaps_using_coin(ctx: &MmArc, coin: &str) -> Result<Vec<Uuid>, Str
 pub fn active_swaps(ctx: &MmArc) -> Result<Vec<Uuid>, String> {
     let swap_ctx = try_s!(SwapsContext::from_ctx(&ctx));
     let swaps = try_s!(swap_ctx.running_swaps.lock());
-    let mut uuids = vec![];
-    for swap in swaps.iter() {
-        if let Some(swap) = swap.upgrade() {
-            uuids.push(*swap.uuid())
-        }
-    }
+    let uuids = swaps
+        .iter()
+        .filter_map(|swap| swap.upgrade())
+        .map(|swap| *swap.uuid())
+        .collect();
     Ok(uuids)
 }
 
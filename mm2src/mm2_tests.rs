@@ -2,15 +2,16 @@ use super::{lp_main, LpMainParams};
 use bigdecimal::BigDecimal;
 #[cfg(target_arch = "wasm32")] use common::call_back;
 use common::executor::Timer;
-use common::for_tests::{check_my_swap_status, check_recent_swaps, check_stats_swap_status,
+use common::for_tests::{check_recent_swaps, check_stats_swap_status, check_swap_status_response,
                         enable_electrum as enable_electrum_impl, enable_native as enable_native_impl, enable_qrc20,
                         find_metrics_in_json, from_env_file, get_passphrase, mm_spat, new_mm2_temp_folder_path,
-                        LocalStart, MarketMakerIt, RaiiDump, MAKER_ERROR_EVENTS, MAKER_SUCCESS_EVENTS,
-                        TAKER_ERROR_EVENTS, TAKER_SUCCESS_EVENTS};
+                        wait_for_swaps_finish, LocalStart, MarketMakerIt, RaiiDump, MAKER_ERROR_EVENTS,
+                        MAKER_SUCCESS_EVENTS, TAKER_ERROR_EVENTS, TAKER_SUCCESS_EVENTS};
 use common::mm_metrics::{MetricType, MetricsJson};
 use common::mm_number::{Fraction, MmNumber};
 use common::privkey::key_pair_from_seed;
 use common::{block_on, slurp};
+use futures::future::{join, join_all, try_join};
 use http::StatusCode;
 #[cfg(not(target_arch = "wasm32"))]
 use hyper::header::ACCESS_CONTROL_ALLOW_ORIGIN;
@@ -1217,61 +1218,56 @@ async fn trade_base_rel_electrum(pairs: &[(&'static str, &'static str)]) {
             .unwrap()
     }
 
-    for uuid in uuids.iter() {
-        mm_bob
-            .wait_for_log(300., |log| log.contains(&format!("[swap uuid={}] Finished", uuid)))
-            .await
-            .unwrap();
-
-        mm_alice
-            .wait_for_log(300., |log| log.contains(&format!("[swap uuid={}] Finished", uuid)))
-            .await
-            .unwrap();
-
-        #[cfg(target_arch = "wasm32")]
-        {
-            log!("Waiting a few second for the fresh swap status to be saved..");
-            Timer::sleep(7.77).await;
-        }
+    log!("Waiting for the swaps to finish..");
+    let (bob_statuses, alice_statuses) = try_join(
+        wait_for_swaps_finish(&mm_bob, &uuids, 300.),
+        wait_for_swaps_finish(&mm_alice, &uuids, 300.),
+    )
+    .await
+    .unwrap();
 
-        log!("Checking alice/taker status..");
-        check_my_swap_status(
-            &mm_alice,
-            &uuid,
+    log!("Checking alice/taker statuses..");
+    for (uuid, status) in uuids.iter().zip(alice_statuses.iter()) {
+        check_swap_status_response(
+            uuid,
+            status,
             &TAKER_SUCCESS_EVENTS,
             &TAKER_ERROR_EVENTS,
             "0.1".parse().unwrap(),
             "0.1".parse().unwrap(),
-        )
-        .await;
+        );
+    }
 
-        log!("Checking bob/maker status..");
-        check_my_swap_status(
-            &mm_bob,
-            &uuid,
+    log!("Checking bob/maker statuses..");
+    for (uuid, status) in uuids.iter().zip(bob_statuses.iter()) {
+        check_swap_status_response(
+            uuid,
+            status,
             &MAKER_SUCCESS_EVENTS,
             &MAKER_ERROR_EVENTS,
             "0.1".parse().unwrap(),
             "0.1".parse().unwrap(),
-        )
-        .await;
+        );
     }
 
     log!("Waiting 3 seconds for nodes to broadcast their swaps data..");
     Timer::sleep(3.).await;
 
-    for uuid in uuids.iter() {
-        log!("Checking alice status..");
-        check_stats_swap_status(&mm_alice, &uuid, &MAKER_SUCCESS_EVENTS, &TAKER_SUCCESS_EVENTS).await;
-
-        log!("Checking bob status..");
-        check_stats_swap_status(&mm_bob, &uuid, &MAKER_SUCCESS_EVENTS, &TAKER_SUCCESS_EVENTS).await;
-    }
+    log!("Checking alice and bob stats statuses..");
+    let alice_checks = uuids
+        .iter()
+        .map(|uuid| check_stats_swap_status(&mm_alice, uuid, &MAKER_SUCCESS_EVENTS, &TAKER_SUCCESS_EVENTS));
+    let bob_checks = uuids
+        .iter()
+        .map(|uuid| check_stats_swap_status(&mm_bob, uuid, &MAKER_SUCCESS_EVENTS, &TAKER_SUCCESS_EVENTS));
+    join_all(alice_checks.chain(bob_checks)).await;
 
-    log!("Checking alice recent swaps..");
-    check_recent_swaps(&mm_alice, uuids.len()).await;
-    log!("Checking bob recent swaps..");
-    check_recent_swaps(&mm_bob, uuids.len()).await;
+    log!("Checking alice and bob recent swaps..");
+    join(
+        check_recent_swaps(&mm_alice, uuids.len()),
+        check_recent_swaps(&mm_bob, uuids.len()),
+    )
+    .await;
     for (base, rel) in pairs.iter() {
         log!("Get " (base) "/" (rel) " orderbook");
         let rc = mm_bob
@@ -11,7 +11,8 @@ use futures::{channel::mpsc, lock::Mutex as AsyncMutex, StreamExt};
 use mm2_libp2p::atomicdex_behaviour::AdexBehaviourCmd;
 use mm2_libp2p::{decode_message, PeerId};
 use mocktopus::mocking::*;
-use rand::{seq::SliceRandom, thread_rng, Rng};
+use rand::distributions::{Distribution, Uniform};
+use rand::{seq::SliceRandom, thread_rng};
 use std::collections::HashSet;
 use std::iter::{self, FromIterator};
 use std::sync::Mutex;
@@ -1342,10 +1343,10 @@ fn make_ctx_for_tests() -> (MmArc, String, [u8; 32]) {
 }
 
 fn make_random_orders(pubkey: String, _secret: &[u8; 32], base: String, rel: String, n: usize) -> Vec<OrderbookItem> {
-    let mut rng = rand::thread_rng();
+    // Build the price numerators distribution once instead of on every `gen_range` call.
+    let numers = Uniform::new(2000u64, 10000000).sample_iter(thread_rng());
     let mut orders = Vec::with_capacity(n);
-    for _i in 0..n {
-        let numer: u64 = rng.gen_range(2000, 10000000);
+    for numer in numers.take(n) {
         let order = new_protocol::MakerOrderCreated {
             uuid: Uuid::new_v4().into(),
             base: base.clone(),